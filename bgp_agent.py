@@ -1,14 +1,80 @@
+import asyncio
+import concurrent.futures
+import threading
+from typing import Optional
+
 import click
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
 from src.client import send_ipc_command
+from src.config import load_config
+from src.server import BGPServer
+from src.utils import log_to_file
 
 # Load environment variables
 load_dotenv()
 
 SOCKET_PATH = "/tmp/bgp_agent.sock"
 
+# Set when the BGP speaker runs inside this process (--in-process)
+BGP_SERVER: Optional[BGPServer] = None
+BGP_LOOP: Optional[asyncio.AbstractEventLoop] = None
+
+# Seconds to wait for the in-process speaker to start listening, and to answer a query
+STARTUP_TIMEOUT = 10.0
+QUERY_TIMEOUT = 10.0
+
+
+def start_in_process_server(config_path: str, log_path: str):
+    """Starts a BGP speaker on its own event loop in a background thread.
+
+    The speaker logs to log_path so it does not interleave with the REPL, and opens no
+    management socket, so a standalone speaker using the same config keeps its socket.
+    Returns once the speaker is listening; raises the startup error if it fails to come up.
+    """
+    global BGP_SERVER, BGP_LOOP
+    log_to_file(log_path)
+    server = BGPServer(load_config(config_path))
+    loop = asyncio.new_event_loop()
+    started = concurrent.futures.Future()
+
+    def run():
+        try:
+            loop.run_until_complete(server.listen(serve_mgmt=False))
+        except Exception as e:
+            started.set_exception(e)
+            loop.close()
+            return
+        started.set_result(None)
+        loop.run_until_complete(server.serve_forever())
+
+    threading.Thread(target=run, daemon=True).start()
+    started.result(timeout=STARTUP_TIMEOUT)
+    BGP_SERVER, BGP_LOOP = server, loop
+
+
+async def _handle_request(request: dict) -> dict:
+    try:
+        return BGP_SERVER.mgmt_server.handle_request(request)
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+def query(command: str, args: Optional[dict] = None) -> dict:
+    """Runs a management command over IPC, or directly on the in-process speaker's loop."""
+    if BGP_SERVER is None:
+        return send_ipc_command(SOCKET_PATH, command, args)
+    if not BGP_LOOP.is_running():
+        return {"status": "error", "message": "In-process BGP speaker is not running"}
+    request = {"command": command, **(args or {})}
+    future = asyncio.run_coroutine_threadsafe(_handle_request(request), BGP_LOOP)
+    try:
+        return future.result(timeout=QUERY_TIMEOUT)
+    except TimeoutError:
+        future.cancel()
+        return {"status": "error", "message": "In-process BGP speaker did not respond"}
+
 
 # Tool Definitions
 def get_neighbor_stats() -> list:
@@ -17,7 +83,7 @@ def get_neighbor_stats() -> list:
     Returns:
         A list of neighbor dictionaries with keys: peer_ip, remote_as, state, uptime, msgs_sent, msgs_received
     """
-    response = send_ipc_command(SOCKET_PATH, "show_neighbors")
+    response = query("show_neighbors")
     if response["status"] == "success":
         return response["data"]
     return []
@@ -32,12 +98,11 @@ def get_routes_received(peer_ip: str = None) -> list:
     Returns:
         A list of route dictionaries with keys: prefix, next_hop, as_path, origin, remote_as, received_from
     """
-    response = send_ipc_command(SOCKET_PATH, "show_routes_received")
+    # Filtering by peer happens on the server, so only that peer's routes are sent back
+    response = query("show_routes_received", {"peer_ip": peer_ip} if peer_ip else None)
     if response["status"] == "success":
-        data = response["data"]
-        if peer_ip:
-            data = [r for r in data if r["received_from"] == peer_ip]
-        return data
+        columns = response["data"]["columns"]
+        return [dict(zip(columns, row)) for row in response["data"]["rows"]]
     return []
 
 
@@ -47,7 +112,7 @@ def get_routes_advertised() -> list:
     Returns:
         A list of prefix strings that are being advertised.
     """
-    response = send_ipc_command(SOCKET_PATH, "show_routes_advertised")
+    response = query("show_routes_advertised")
     if response["status"] == "success":
         return response["data"]
     return []
@@ -62,12 +127,10 @@ def count_unique_routers_in_asn(asn: int) -> int:
     Returns:
         The number of peers with the specified remote ASN.
     """
-    neighbors = get_neighbor_stats()
-    count = 0
-    for n in neighbors:
-        if n["remote_as"] == asn:
-            count += 1
-    return count
+    response = query("count_peers_by_asn", {"asn": asn})
+    if response["status"] == "success":
+        return response["data"]
+    return 0
 
 
 SYSTEM_INSTRUCTION = """You are a senior Network Operations Center (NOC) engineer.
@@ -77,11 +140,36 @@ When asked about routes, use get_routes_received or get_routes_advertised as app
 Provide concise, accurate answers based on the actual data from the tools.
 """
 
+# The tool set is static, so the config object is built once and reused;
+# the SDK still derives the function declarations from the callables on each request
+GENERATE_CONFIG = types.GenerateContentConfig(
+    system_instruction=SYSTEM_INSTRUCTION,
+    tools=[
+        get_neighbor_stats,
+        get_routes_received,
+        get_routes_advertised,
+        count_unique_routers_in_asn,
+    ],
+)
+
 
 @click.command()
 @click.option("--socket", default="/tmp/bgp_agent.sock", help="Path to BGP agent socket")
 @click.option("--api-key", envvar="GEMINI_API_KEY", help="Gemini API Key")
-def run_agent(socket, api_key):
+@click.option(
+    "--in-process",
+    "config_path",
+    default=None,
+    metavar="CONFIG",
+    help="Run the BGP speaker from CONFIG inside the agent and query it directly instead of over the socket",
+)
+@click.option(
+    "--speaker-log",
+    default="/tmp/bgp_agent_speaker.log",
+    show_default=True,
+    help="Log file for the in-process BGP speaker",
+)
+def run_agent(socket, api_key, config_path, speaker_log):
     """Run the AI Network Analyst Agent."""
     global SOCKET_PATH
     SOCKET_PATH = socket
@@ -90,6 +178,13 @@ def run_agent(socket, api_key):
         click.echo("Error: GEMINI_API_KEY not found. Set it in .env or pass --api-key.")
         return
 
+    if config_path:
+        try:
+            start_in_process_server(config_path, speaker_log)
+        except Exception as e:
+            click.echo(f"Error: failed to start the in-process BGP speaker: {e}")
+            return
+
     # Create client with API key
     client = genai.Client(api_key=api_key)
 
@@ -111,15 +206,7 @@ def run_agent(socket, api_key):
             response = client.models.generate_content(
                 model="gemini-3-flash-preview",
                 contents=history,
-                config=types.GenerateContentConfig(
-                    system_instruction=SYSTEM_INSTRUCTION,
-                    tools=[
-                        get_neighbor_stats,
-                        get_routes_received,
-                        get_routes_advertised,
-                        count_unique_routers_in_asn,
-                    ],
-                ),
+                config=GENERATE_CONFIG,
             )
 
             # Add model response to history
@@ -73,18 +73,8 @@ def routes_received():
             "Remote AS",
             "Received From",
         ]
-        table = [
-            [
-                d["prefix"],
-                d["next_hop"],
-                d["as_path"],
-                d["origin"],
-                d["remote_as"],
-                d["received_from"],
-            ]
-            for d in data
-        ]
-        print(tabulate(table, headers=headers, tablefmt="grid"))
+        # Rows are positional, in the order of data["columns"]
+        print(tabulate(data["rows"], headers=headers, tablefmt="grid"))
     else:
         click.echo(f"Error: {response.get('message')}", err=True)
 
@@ -3,6 +3,14 @@ import argparse
 from src.server import BGPServer
 from src.config import load_config
 
+# uvloop (the "fast" extra) is a drop-in, faster event loop for the socket-bound session code
+try:
+    import uvloop
+
+    loop_factory = uvloop.new_event_loop
+except ImportError:
+    loop_factory = None
+
 
 async def main():
     parser = argparse.ArgumentParser(description="Asyncio BGP Speaker")
@@ -22,6 +30,6 @@ async def main():
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        asyncio.run(main(), loop_factory=loop_factory)
     except KeyboardInterrupt:
         pass
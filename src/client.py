@@ -1,27 +1,67 @@
 import socket
-import json
+from typing import Optional
 
+import orjson
 
-def send_ipc_command(socket_path: str, command: str) -> dict:
+from src.utils import FRAME_LEN
+
+# Open connections per socket path, reused across commands
+_connections: dict[str, socket.socket] = {}
+
+
+def _get_connection(socket_path: str) -> socket.socket:
+    client_socket = _connections.get(socket_path)
+    if client_socket is None:
+        client_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            client_socket.connect(socket_path)
+        except OSError:
+            client_socket.close()
+            raise
+        _connections[socket_path] = client_socket
+    return client_socket
+
+
+def _close_connection(socket_path: str):
+    client_socket = _connections.pop(socket_path, None)
+    if client_socket:
+        client_socket.close()
+
+
+def _recv_exactly(client_socket: socket.socket, length: int) -> bytearray:
+    """Reads exactly `length` bytes into a pre-allocated buffer."""
+    buf = bytearray(length)
+    view = memoryview(buf)
+    received = 0
+    while received < length:
+        n = client_socket.recv_into(view[received:], length - received, socket.MSG_WAITALL)
+        if not n:
+            raise ConnectionError("Connection closed before full response")
+        received += n
+    return buf
+
+
+def send_ipc_command(socket_path: str, command: str, args: Optional[dict] = None) -> dict:
     """
-    Sends a command to the BGP Agent via Unix Domain Socket.
+    Sends a command, with optional arguments, to the BGP Agent via Unix Domain Socket.
+
+    Messages in both directions are framed with a 4-byte big-endian length prefix.
+    The connection is kept open and reused by subsequent commands.
     """
-    client_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-    try:
-        client_socket.connect(socket_path)
-        request = json.dumps({"command": command})
-        client_socket.sendall(request.encode())
-
-        # Read response
-        response_data = b""
-        while True:
-            chunk = client_socket.recv(4096)
-            if not chunk:
-                break
-            response_data += chunk
-
-        return json.loads(response_data.decode())
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
-    finally:
-        client_socket.close()
+    request = orjson.dumps({"command": command, **(args or {})})
+    frame = FRAME_LEN.pack(len(request)) + request
+
+    while True:
+        reused = socket_path in _connections
+        try:
+            client_socket = _get_connection(socket_path)
+            client_socket.sendall(frame)
+
+            # Read response
+            length = FRAME_LEN.unpack(_recv_exactly(client_socket, 4))[0]
+            return orjson.loads(_recv_exactly(client_socket, length))
+        except Exception as e:
+            _close_connection(socket_path)
+            # A reused connection may have been closed by the server (e.g. restart); retry once on a fresh one
+            if not (reused and isinstance(e, OSError)):
+                return {"status": "error", "message": str(e)}
@@ -1,11 +1,25 @@
 import asyncio
-import json
+import socket
+from itertools import chain
 from typing import TYPE_CHECKING
-from src.utils import setup_logging
+
+import orjson
+
+from src.utils import FRAME_LEN, setup_logging
 from src.fsm import BGPState
 
 if TYPE_CHECKING:
     from src.server import BGPServer
+    from src.session import BGPSession
+
+ROUTE_COLUMNS = ["prefix", "next_hop", "as_path", "origin", "remote_as", "received_from"]
+
+# Envelope of a streamed show_routes_received response; the per-session rows go in between
+_ROUTES_HEAD = b'{"status":"success","data":{"columns":' + orjson.dumps(ROUTE_COLUMNS) + b',"rows":['
+_ROUTES_TAIL = b"]}}"
+
+# Requests are small JSON commands; anything larger is a broken or hostile client
+MAX_REQUEST_LEN = 1 << 20
 
 
 class ManagementServer:
@@ -14,81 +28,146 @@ class ManagementServer:
         self.socket_path = socket_path
         self.logger = setup_logging("MgmtServer")
 
+        # Per-peer JSON encoding of the show_routes_received rows, keyed by the session
+        # and RIB version it was built from. Only the encoded bytes are kept, not the rows
+        self._rows_cache: dict[str, tuple[tuple, bytes]] = {}
+
     async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # Requests and responses are framed with a 4-byte big-endian length prefix,
+        # so a client can keep the connection open across several commands.
+        # Larger buffers let big RIB snapshots go out without stalling. Accepted Unix
+        # sockets do not inherit them from the listener, so set them per connection
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
         try:
-            data = await reader.read(4096)
-            if not data:
-                return
-
-            request = json.loads(data.decode())
-            command = request.get("command")
-
-            response = {"status": "error", "message": "Unknown command"}
-
-            if command == "show_neighbors":
-                neighbors = []
-                for session in self.bgp_server.sessions.values():
-                    # Calculate uptime
-                    uptime_str = "N/A"
-                    if session.start_time and session.state == BGPState.ESTABLISHED:
-                        import datetime
-
-                        delta = datetime.datetime.now() - session.start_time
-                        uptime_str = str(delta).split(".")[0]  # removing microseconds
-
-                    neighbors.append(
-                        {
-                            "peer_ip": session.bgp_id,  # Assuming bgp_id is IP
-                            "remote_as": session.remote_as or 0,
-                            "state": session.state.name,
-                            "uptime": uptime_str,
-                            "msgs_sent": session.msgs_sent,
-                            "msgs_received": session.msgs_received,
-                        }
-                    )
-                response = {"status": "success", "data": neighbors}
-
-            elif command == "show_routes_received":
-                routes = []
-                for session in self.bgp_server.sessions.values():
-                    for route in session.adj_rib_in:
-                        routes.append(
-                            {
-                                "prefix": route.prefix,
-                                "next_hop": route.next_hop,
-                                "as_path": str(route.as_path),
-                                "origin": route.origin,
-                                "remote_as": session.remote_as or 0,
-                                "received_from": session.bgp_id,
-                            }
-                        )
-                response = {"status": "success", "data": routes}
-
-            elif command == "show_routes_advertised":
-                # Currently we advertise same prefixes to all peers
-                response = {
-                    "status": "success",
-                    "data": self.bgp_server.config.originated_prefixes,
-                }
-
-            writer.write(json.dumps(response).encode())
-            await writer.drain()
-
+            while True:
+                header = await reader.readexactly(4)
+                length = FRAME_LEN.unpack(header)[0]
+                if length > MAX_REQUEST_LEN:
+                    self.logger.error(f"Management request too large ({length} bytes), closing connection")
+                    return
+                data = await reader.readexactly(length)
+
+                try:
+                    parts = self.encode_response(orjson.loads(data))
+                except Exception as e:
+                    self.logger.error(f"Error handling management request: {e}")
+                    parts = [orjson.dumps({"status": "error", "message": str(e)})]
+
+                # Write the response part by part so a large RIB is never joined into one buffer.
+                # Only wait on drain once the transport has buffered past its high-water mark
+                writer.write(FRAME_LEN.pack(sum(map(len, parts))))
+                transport = writer.transport
+                high_water = transport.get_write_buffer_limits()[1]
+                for part in parts:
+                    writer.write(part)
+                    if transport.get_write_buffer_size() > high_water:
+                        await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            # Client closed the connection
+            pass
         except Exception as e:
-            self.logger.error(f"Error handling management request: {e}")
-            error_response = {"status": "error", "message": str(e)}
-            writer.write(json.dumps(error_response).encode())
-            await writer.drain()
+            self.logger.error(f"Management connection error: {e}")
         finally:
             writer.close()
 
+    def encode_response(self, request: dict) -> list[bytes]:
+        """Returns the serialized response as a list of parts to be written in order."""
+        if request.get("command") == "show_routes_received" and not request.get("peer_ip"):
+            # Full table: splice each session's cached encoding instead of encoding one large response
+            parts = [_ROUTES_HEAD]
+            for session in self.bgp_server.sessions.values():
+                rows_json = self._session_json(session)
+                if rows_json:
+                    if len(parts) > 1:
+                        parts.append(b",")
+                    parts.append(rows_json)
+            parts.append(_ROUTES_TAIL)
+            return parts
+
+        return [orjson.dumps(self.handle_request(request))]
+
+    def handle_request(self, request: dict) -> dict:
+        command = request.get("command")
+
+        response = {"status": "error", "message": "Unknown command"}
+
+        if command == "show_neighbors":
+            neighbors = []
+            for session in self.bgp_server.sessions.values():
+                # Calculate uptime
+                uptime_str = "N/A"
+                if session.start_time is not None and session.state == BGPState.ESTABLISHED:
+                    minutes, seconds = divmod(int(session.loop.time() - session.start_time), 60)
+                    hours, minutes = divmod(minutes, 60)
+                    uptime_str = f"{hours:d}:{minutes:02d}:{seconds:02d}"
+
+                neighbors.append(
+                    {
+                        "peer_ip": session.peer_ip,
+                        "remote_as": session.remote_as or 0,
+                        "state": session.state.name,
+                        "uptime": uptime_str,
+                        "msgs_sent": session.msgs_sent,
+                        "msgs_received": session.msgs_received,
+                    }
+                )
+            response = {"status": "success", "data": neighbors}
+
+        elif command == "show_routes_received":
+            # Routes are sent as positional rows; the column names are sent once
+            peer_ip = request.get("peer_ip")
+            if peer_ip:
+                session = self.bgp_server.sessions.get(peer_ip)
+                rows = self._session_rows(session) if session else []
+            else:
+                rows = list(chain.from_iterable(map(self._session_rows, self.bgp_server.sessions.values())))
+            response = {"status": "success", "data": {"columns": ROUTE_COLUMNS, "rows": rows}}
+
+        elif command == "count_peers_by_asn":
+            asn = request["asn"]
+            count = sum(1 for session in self.bgp_server.sessions.values() if session.remote_as == asn)
+            response = {"status": "success", "data": count}
+
+        elif command == "show_routes_advertised":
+            # Currently we advertise same prefixes to all peers
+            response = {
+                "status": "success",
+                "data": self.bgp_server.config.originated_prefixes,
+            }
+
+        return response
+
+    def _session_rows(self, session: "BGPSession") -> list[tuple]:
+        remote_as = session.remote_as or 0
+        received_from = session.peer_ip
+        return [
+            (route.prefix, route.next_hop, route.as_path_str, route.origin, remote_as, received_from)
+            for route in session.adj_rib_in
+        ]
+
+    def _session_json(self, session: "BGPSession") -> bytes:
+        """Returns one session's rows as comma-separated JSON arrays without the enclosing brackets.
+
+        Re-encoded only when the session's RIB changed; the rows themselves are built per
+        session while encoding and then dropped.
+        """
+        key = (session, session.rib_version, session.remote_as)
+        entry = self._rows_cache.get(session.peer_ip)
+        if entry is None or entry[0] != key:
+            entry = (key, orjson.dumps(self._session_rows(session))[1:-1])
+            self._rows_cache[session.peer_ip] = entry
+        return entry[1]
+
     async def start(self):
         import os
 
         if os.path.exists(self.socket_path):
             os.remove(self.socket_path)
 
-        server = await asyncio.start_unix_server(self.handle_client, path=self.socket_path)
+        server = await asyncio.start_unix_server(self.handle_client, path=self.socket_path, backlog=socket.SOMAXCONN)
         self.logger.info(f"Management Server listening on {self.socket_path}")
         async with server:
             await server.serve_forever()
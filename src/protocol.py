@@ -1,8 +1,9 @@
+import functools
 import struct
 import socket
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import ClassVar, List
+from typing import ClassVar, List, Optional
 
 # BGP Message Types
 OPEN = 1
@@ -10,6 +11,29 @@ UPDATE = 2
 NOTIFICATION = 3
 KEEPALIVE = 4
 
+# Maximum BGP message size, header included (RFC 4271)
+MAX_MESSAGE_LEN = 4096
+
+# Fixed part of an UPDATE: the 19-byte header plus the 2-byte Withdrawn Routes Length
+# and 2-byte Total Path Attribute Length fields
+UPDATE_FIXED_LEN = 19 + 2 + 2
+
+# Worst-case bytes for one IPv4 NLRI prefix: the length byte plus 4 address bytes (/25 to /32)
+MAX_PREFIX_NLRI_LEN = 5
+
+# All-ones marker that starts every BGP message
+MARKER = b"\xff" * 16
+
+# Precompiled wire formats
+_HDR = struct.Struct("!16sHB")
+_OPEN = struct.Struct("!BHH4sB")
+_BB = struct.Struct("!BB")
+_B = struct.Struct("!B")
+_U16 = struct.Struct("!H")
+
+# Bytes used by an IPv4 NLRI prefix, indexed by its prefix length
+_NLRI_BYTES = tuple((length + 7) // 8 for length in range(33))
+
 
 @dataclass
 class BGPHeader:
@@ -20,20 +44,24 @@ class BGPHeader:
     @staticmethod
     def pack(msg_type: int, payload: bytes = b"") -> bytes:
         """Packs a BGP message with header."""
-        marker = b"\xff" * 16
         length = 19 + len(payload)
-        return struct.pack("!16sHB", marker, length, msg_type) + payload
+        return _HDR.pack(MARKER, length, msg_type) + payload
 
     @staticmethod
     def unpack(data: bytes) -> tuple["BGPHeader", bytes]:
         """Unpacks BGP header and returns (header, payload)."""
         if len(data) < 19:
             raise ValueError("Data too short for BGP header")
-        marker, length, msg_type = struct.unpack("!16sHB", data[:19])
-        if marker != b"\xff" * 16:
+        marker, length, msg_type = _HDR.unpack_from(data, 0)
+        if marker != MARKER:
             raise ValueError("Invalid BGP marker")
         return BGPHeader(marker, length, msg_type), data[19:length]
 
+    @staticmethod
+    def peek_length(buf, offset: int = 0) -> int:
+        """Reads the length field of the header starting at offset, without copying or validating it."""
+        return _U16.unpack_from(buf, offset + 16)[0]
+
 
 class BGPMessage(ABC):
     msg_type: int
@@ -58,14 +86,12 @@ class OpenMessage(BGPMessage):
     opt_params: bytes = b""
 
     def pack(self) -> bytes:
-        bgp_id_int = struct.unpack("!I", socket.inet_aton(self.bgp_identifier))[0]
         payload = (
-            struct.pack(
-                "!BHHIB",
+            _OPEN.pack(
                 self.version,
                 self.my_as,
                 self.hold_time,
-                bgp_id_int,
+                socket.inet_aton(self.bgp_identifier),
                 len(self.opt_params),
             )
             + self.opt_params
@@ -74,8 +100,8 @@ class OpenMessage(BGPMessage):
 
     @classmethod
     def unpack(cls, data: bytes) -> "OpenMessage":
-        version, my_as, hold_time, bgp_id_int, opt_len = struct.unpack("!BHHIB", data[:10])
-        bgp_identifier = socket.inet_ntoa(struct.pack("!I", bgp_id_int))
+        version, my_as, hold_time, bgp_id_bytes, opt_len = _OPEN.unpack_from(data, 0)
+        bgp_identifier = socket.inet_ntoa(bgp_id_bytes)
         opt_params = data[10 : 10 + opt_len]
         return cls(version, my_as, hold_time, bgp_identifier, opt_params)
 
@@ -100,12 +126,12 @@ class NotificationMessage(BGPMessage):
     data: bytes = b""
 
     def pack(self) -> bytes:
-        payload = struct.pack("!BB", self.error_code, self.error_subcode) + self.data
+        payload = _BB.pack(self.error_code, self.error_subcode) + self.data
         return BGPHeader.pack(self.msg_type, payload)
 
     @classmethod
     def unpack(cls, data: bytes) -> "NotificationMessage":
-        error_code, error_subcode = struct.unpack("!BB", data[:2])
+        error_code, error_subcode = _BB.unpack_from(data, 0)
         return cls(error_code, error_subcode, data[2:])
 
 
@@ -121,23 +147,25 @@ class UpdateMessage(BGPMessage):
     # but the packing needs to follow the length fields structure.
 
     def pack(self) -> bytes:
-        payload = struct.pack("!H", len(self.withdrawn_routes)) + self.withdrawn_routes
-        payload += struct.pack("!H", len(self.path_attributes)) + self.path_attributes
+        payload = _U16.pack(len(self.withdrawn_routes)) + self.withdrawn_routes
+        payload += _U16.pack(len(self.path_attributes)) + self.path_attributes
         payload += self.nlri
         return BGPHeader.pack(self.msg_type, payload)
 
     @classmethod
     def unpack(cls, data: bytes) -> "UpdateMessage":
         offset = 0
-        w_len = struct.unpack("!H", data[offset : offset + 2])[0]
+        w_len = _U16.unpack_from(data, offset)[0]
         offset += 2
         withdrawn_routes = data[offset : offset + w_len]
         offset += w_len
 
-        pa_len = struct.unpack("!H", data[offset : offset + 2])[0]
+        pa_len = _U16.unpack_from(data, offset)[0]
         offset += 2
         path_attributes = data[offset : offset + pa_len]
         offset += pa_len
+        if offset > len(data):
+            raise ValueError("UPDATE length fields exceed the message")
 
         nlri = data[offset:]
         return cls(withdrawn_routes, path_attributes, nlri)
@@ -145,19 +173,49 @@ class UpdateMessage(BGPMessage):
     @staticmethod
     def encode_nlri(prefixes: List[str]) -> bytes:
         """Encodes a list of prefixes (e.g., '10.0.0.0/24') into NLRI bytes."""
-        nlri_bytes = b""
-        for prefix in prefixes:
-            ip_str, length_str = prefix.split("/")
-            length = int(length_str)
-            ip_int = struct.unpack("!I", socket.inet_aton(ip_str))[0]
+        return _encode_nlri(tuple(prefixes))
 
-            # Calculate bytes needed for the prefix
-            # 24 -> 3 bytes, 25 -> 4 bytes
-            num_bytes = (length + 7) // 8
-            prefix_bytes = struct.pack("!I", ip_int)[:num_bytes]
+    @staticmethod
+    def decode_nlri(data: bytes) -> List[str]:
+        """Decodes NLRI bytes into a list of prefixes (e.g., '10.0.0.0/24')."""
+        inet_ntoa = socket.inet_ntoa
+        prefixes = []
+        append = prefixes.append
+        idx = 0
+        while idx < len(data):
+            length = data[idx]
+            end = idx + 1 + _NLRI_BYTES[length]
+            # Pad to 4 bytes for valid ipv4 conversion
+            append(f"{inet_ntoa(data[idx + 1 : end].ljust(4, b'\x00'))}/{length}")
+            idx = end
+        return prefixes
 
-            nlri_bytes += struct.pack("!B", length) + prefix_bytes
-        return nlri_bytes
+    @staticmethod
+    def decode_next_hop(path_attributes: bytes) -> Optional[str]:
+        """Returns the NEXT_HOP attribute as an IP string, or None if it is absent."""
+        # This parsing is extremely simplified and brittle, purely for the demo requirement
+        # We only scan the attribute TLVs for NEXT_HOP (Type 3)
+        # Attribute values are only materialized when used, so walk them through a memoryview
+        pa = memoryview(path_attributes)
+        pidx = 0
+        while pidx < len(pa):
+            flags = pa[pidx]
+            type_code = pa[pidx + 1]
+            pidx += 2
+
+            # Check extended length flag (0x10)
+            if flags & 0x10:
+                attr_len = _U16.unpack_from(pa, pidx)[0]
+                pidx += 2
+            else:
+                attr_len = pa[pidx]
+                pidx += 1
+
+            if type_code == 3:  # NEXT_HOP
+                return socket.inet_ntoa(pa[pidx : pidx + attr_len])
+
+            pidx += attr_len
+        return None
 
     @staticmethod
     def encode_origin(origin: int = 0) -> bytes:
@@ -165,33 +223,60 @@ class UpdateMessage(BGPMessage):
         # Flag: 0x40 (Transitive)
         # Type: 1 (ORIGIN)
         # Length: 1
-        return b"\x40\x01\x01" + struct.pack("!B", origin)
+        return b"\x40\x01\x01" + _B.pack(origin)
 
     @staticmethod
     def encode_as_path(asn_list: List[int]) -> bytes:
         """Encodes AS_PATH attribute. Supports AS_SEQUENCE only."""
-        # Flag: 0x40 (Transitive)
-        # Type: 2 (AS_PATH)
-        if not asn_list:
-            return b"\x40\x02\x00"
-
-        # We use AS_SEQUENCE (2)
-        # Segment Type: 2 (AS_SEQUENCE)
-        # Segment Length: number of ASes
-        path_data = b"\x02" + struct.pack("!B", len(asn_list))
-        for asn in asn_list:
-            path_data += struct.pack("!H", asn)  # 2-byte ASN for simplicity (BGP-4)
-
-        length = len(path_data)
-        return b"\x40\x02" + struct.pack("!B", length) + path_data
+        return _encode_as_path(tuple(asn_list))
 
     @staticmethod
     def encode_next_hop(next_hop_ip: str) -> bytes:
         """Encodes NEXT_HOP attribute."""
-        # Flag: 0x40 (Transitive)
-        # Type: 3 (NEXT_HOP)
-        # Length: 4
-        return b"\x40\x03\x04" + socket.inet_aton(next_hop_ip)
+        return _encode_next_hop(next_hop_ip)
+
+
+# The same originated prefixes and attributes are advertised to every peer,
+# so the encoders below are memoized on their (immutable) arguments.
+@functools.lru_cache(maxsize=1024)
+def _encode_nlri(prefixes: tuple[str, ...]) -> bytes:
+    # Each prefix is parsed once; any list of known prefixes is then a single C-level join
+    return b"".join(map(_encode_prefix, prefixes))
+
+
+@functools.lru_cache(maxsize=4096)
+def _encode_prefix(prefix: str) -> bytes:
+    ip_str, length_str = prefix.split("/")
+    length = int(length_str)
+
+    # Bytes needed for the prefix: 24 -> 3 bytes, 25 -> 4 bytes
+    num_bytes = _NLRI_BYTES[length]
+    return _B.pack(length) + socket.inet_aton(ip_str)[:num_bytes]
+
+
+@functools.lru_cache(maxsize=1024)
+def _encode_as_path(asn_list: tuple[int, ...]) -> bytes:
+    # Flag: 0x40 (Transitive)
+    # Type: 2 (AS_PATH)
+    if not asn_list:
+        return b"\x40\x02\x00"
+
+    # We use AS_SEQUENCE (2)
+    # Segment Type: 2 (AS_SEQUENCE)
+    # Segment Length: number of ASes
+    # 2-byte ASNs for simplicity (BGP-4), packed in a single call
+    path_data = b"\x02" + _B.pack(len(asn_list)) + struct.pack(f"!{len(asn_list)}H", *asn_list)
+
+    length = len(path_data)
+    return b"\x40\x02" + _B.pack(length) + path_data
+
+
+@functools.lru_cache(maxsize=1024)
+def _encode_next_hop(next_hop_ip: str) -> bytes:
+    # Flag: 0x40 (Transitive)
+    # Type: 3 (NEXT_HOP)
+    # Length: 4
+    return b"\x40\x03\x04" + socket.inet_aton(next_hop_ip)
 
 
 def parse_bgp_message(header: BGPHeader, payload: bytes) -> BGPMessage:
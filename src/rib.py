@@ -1,10 +1,15 @@
-from dataclasses import dataclass
-from typing import List
+from dataclasses import dataclass, field
 
 
-@dataclass
+# slots: no per-route __dict__, which keeps large Adj-RIB-Ins compact
+@dataclass(slots=True)
 class Route:
     prefix: str
     next_hop: str
-    as_path: List[int]
+    as_path: tuple[int, ...]  # Immutable, so routes from one UPDATE can share it
     origin: str
+    # as_path rendered once when the route is learned, for management responses
+    as_path_str: str = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.as_path_str = str(list(self.as_path))
@@ -6,41 +6,57 @@ from src.config import BGPConfig
 from src.mgmt import ManagementServer
 
 
+class _Handoff(asyncio.Protocol):
+    """Passes a new transport to a callback, which attaches the peer's BGPSession before any data is read."""
+
+    def __init__(self, on_connect):
+        self.on_connect = on_connect
+
+    def connection_made(self, transport: asyncio.Transport):
+        self.on_connect(transport)
+
+
 class BGPServer:
     def __init__(self, config: BGPConfig):
         self.config = config
         self.logger = setup_logging("BGPServer")
         self.server: Optional[asyncio.AbstractServer] = None
         self.sessions = {}  # Keep track of sessions
+        self.tasks: set[asyncio.Task] = set()  # The loop only holds weak references to tasks
+        self._peer_by_ip = {p.ip: p for p in config.peers}
         self.mgmt_server = ManagementServer(self, socket_path=config.local.socket_path)
 
         self.logger.info(f"Initialized BGP Server with ASN {config.local.asn}, Router ID {config.local.router_id}")
 
-    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
-        peer_addr = writer.get_extra_info("peername")
+    def handle_client(self, transport: asyncio.Transport):
+        peer_addr = transport.get_extra_info("peername")
         peer_ip = peer_addr[0]
         self.logger.info(f"Accepted connection from {peer_addr}")
 
         # Check existing session
         if peer_ip in self.sessions:
             self.logger.warning(f"Session for {peer_ip} already exists. Ignoring new connection.")
-            writer.close()
+            transport.close()
             return
 
-        peer_config = None
-        for p in self.config.peers:
-            if p.ip == peer_ip:
-                peer_config = p
-                break
-
+        peer_config = self._peer_by_ip.get(peer_ip)
         if not peer_config:
             self.logger.warning(f"Connection from unknown peer {peer_ip}. Closing.")
-            writer.close()
+            transport.close()
             return
 
-        hold_time = peer_config.hold_time
+        self.start_session(transport, peer_ip, peer_config.hold_time)
+
+    def handle_connected(self, transport: asyncio.Transport, peer_ip: str, hold_time: int):
+        # Check race condition again
+        if peer_ip in self.sessions:
+            transport.close()
+            return
 
-        # Create a new session for this peer
+        self.start_session(transport, peer_ip, hold_time)
+
+    def start_session(self, transport: asyncio.Transport, peer_ip: str, hold_time: int):
+        # Create a new session for this peer and make it the transport's protocol
         session = BGPSession(
             self.config.local.asn,
             self.config.local.router_id,
@@ -49,21 +65,35 @@ class BGPServer:
             self.config.originated_prefixes,
         )
         self.sessions[peer_ip] = session
-
-        await session.connection_made(reader, writer)
+        transport.set_protocol(session)
+        session.connection_made(transport)
 
     async def start(self):
-        self.server = await asyncio.start_server(self.handle_client, "0.0.0.0", self.config.local.port)
+        await self.listen()
+        await self.serve_forever()
+
+    async def listen(self, serve_mgmt: bool = True):
+        """Binds the BGP listener and starts the management server and outbound connections.
+
+        With serve_mgmt=False the management socket is not opened; requests then go straight
+        to mgmt_server.handle_request, as the in-process agent does.
+        """
+        loop = asyncio.get_running_loop()
+        self.server = await loop.create_server(lambda: _Handoff(self.handle_client), "0.0.0.0", self.config.local.port)
         addr = self.server.sockets[0].getsockname()
         self.logger.info(f"BGP Speaker listening on {addr}")
 
         # Start Management Server
-        asyncio.create_task(self.mgmt_server.start())
+        if serve_mgmt:
+            self.tasks.add(asyncio.create_task(self.mgmt_server.start()))
 
         # Initiate connections to peers
         for peer in self.config.peers:
-            asyncio.create_task(self.connect_peer(peer.ip, peer.port, peer.hold_time))
+            task = asyncio.create_task(self.connect_peer(peer.ip, peer.port, peer.hold_time))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
 
+    async def serve_forever(self):
         async with self.server:
             await self.server.serve_forever()
 
@@ -88,24 +118,15 @@ class BGPServer:
                     continue
 
             try:
-                reader, writer = await asyncio.open_connection(peer_ip, peer_port)
+                transport, _ = await asyncio.get_running_loop().create_connection(
+                    lambda: _Handoff(lambda t: self.handle_connected(t, peer_ip, hold_time)), peer_ip, peer_port
+                )
                 self.logger.info(f"Connected to {peer_ip}:{peer_port}")
 
-                # Check race condition again
-                if peer_ip in self.sessions:
-                    writer.close()
+                if transport.is_closing():
+                    # Lost the race to an accepted connection
                     await asyncio.sleep(5)
                     continue
-
-                session = BGPSession(
-                    self.config.local.asn,
-                    self.config.local.router_id,
-                    peer_ip,
-                    hold_time,
-                    self.config.originated_prefixes,
-                )
-                self.sessions[peer_ip] = session
-                await session.connection_made(reader, writer)
                 return
             except Exception as e:
                 self.logger.error(f"Failed to connect to {peer_ip}:{peer_port}: {e}. Retrying in 5s...")
@@ -1,4 +1,5 @@
 import asyncio
+import logging
 from typing import Optional
 
 from src.protocol import (
@@ -8,18 +9,60 @@ from src.protocol import (
     KeepAliveMessage,
     NotificationMessage,
     UpdateMessage,
+    MAX_MESSAGE_LEN,
+    MAX_PREFIX_NLRI_LEN,
+    UPDATE_FIXED_LEN,
+    NOTIFICATION,
+    OPEN,
+    UPDATE,
     parse_bgp_message,
 )
 from src.fsm import BGPState
 from src.utils import setup_logging
 
 
-from datetime import datetime
 from src.rib import Route
-import struct
 
+# KEEPALIVE is a bare header, so its wire form never changes
+_KEEPALIVE_WIRE = KeepAliveMessage().pack()
+
+# NOTIFICATION (code, subcode) sent when a message body fails to parse (RFC 4271 6.1-6.3):
+# OPEN Message Error (2), Unspecific (0) and UPDATE Message Error (3), Malformed Attribute List (1).
+# Anything else that reaches the parser has an unknown type: Header Error (1), Bad Message Type (3)
+_PARSE_ERRORS = {OPEN: (2, 0), UPDATE: (3, 1)}
+
+
+class BGPSession(asyncio.Protocol):
+    # Fixed attribute layout: no per-session __dict__, and slot access on the per-message path
+    __slots__ = (
+        "state",
+        "my_as",
+        "bgp_id",
+        "peer_ip",
+        "hold_time",
+        "originated_prefixes",
+        "negotiated_hold_time",
+        "_open_wire",
+        "_update_wire",
+        "transport",
+        "_buf",
+        "peer_header",
+        "loop",
+        "keepalive_timer",
+        "keepalive_interval",
+        "hold_timer",
+        "hold_deadline",
+        "logger",
+        "_log_info",
+        "_info_enabled",
+        "msgs_sent",
+        "msgs_received",
+        "start_time",
+        "remote_as",
+        "adj_rib_in",
+        "rib_version",
+    )
 
-class BGPSession:
     def __init__(
         self,
         my_as: int,
@@ -35,279 +78,298 @@ class BGPSession:
         self.hold_time = hold_time  # Configured hold time
         self.originated_prefixes = originated_prefixes or []
         self.negotiated_hold_time = 0
-
-        self.reader: Optional[asyncio.StreamReader] = None
-        self.writer: Optional[asyncio.StreamWriter] = None
+        # Everything in our OPEN is fixed by config, so pack it once
+        self._open_wire = OpenMessage(
+            version=4,
+            my_as=my_as,
+            hold_time=hold_time,
+            bgp_identifier=bgp_id,
+        ).pack()
+        # Originated prefixes and our attributes are fixed for the session, and so are the UPDATEs
+        self._update_wire = self.pack_updates()
+
+        self.transport: Optional[asyncio.Transport] = None
+        self._buf = bytearray()  # Received bytes not yet parsed into messages
         self.peer_header: Optional[dict] = None  # Stores remote_as from OPEN
 
-        self.keepalive_timer_task: Optional[asyncio.Task] = None
-        self.hold_timer_task: Optional[asyncio.Task] = None
-        self.hold_timer_reset_event = asyncio.Event()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        # Keepalive timer: each callback sends one KEEPALIVE and schedules the next
+        self.keepalive_timer: Optional[asyncio.TimerHandle] = None
+        self.keepalive_interval = 0.0
+        # Hold timer: incoming messages only push the deadline; the timer re-arms itself when it fires early
+        self.hold_timer: Optional[asyncio.TimerHandle] = None
+        self.hold_deadline = 0.0
 
         self.logger = setup_logging(f"BGPSession-{self.bgp_id}")
+        # Per-message log calls check this first so disabled levels never pay for formatting
+        self._log_info = self.logger.info
+        self._info_enabled = self.logger.isEnabledFor(logging.INFO)
 
         # Stats
         self.msgs_sent = 0
         self.msgs_received = 0
-        self.start_time = None
+        self.start_time: Optional[float] = None  # Loop time (monotonic seconds) when the TCP connection came up
         self.remote_as = None
 
         # RIB
         self.adj_rib_in: list[Route] = []
+        self.rib_version = 0  # Bumped on every Adj-RIB-In change
 
-    async def connection_made(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
-        self.reader = reader
-        self.writer = writer
-        self.start_time = datetime.now()
+    def connection_made(self, transport: asyncio.Transport):
+        self.transport = transport
+        self.loop = asyncio.get_running_loop()
+        self.start_time = self.loop.time()
         self.logger.info("TCP Connection established")
 
         # Simplified: Force transition to OPEN_SENT and send OPEN
         self.state = BGPState.OPEN_SENT
-        await self.send_open()
+        self.send_open()
+
+    def connection_lost(self, exc: Optional[Exception]):
+        if self.transport is None:
+            # We closed it ourselves
+            return
+        if exc is None:
+            self.logger.info("Peer closed connection")
+        elif isinstance(exc, ConnectionResetError):
+            self.logger.info("Connection reset by peer")
+        else:
+            self.logger.error(f"Connection lost: {exc}")
+        self.close_connection()
 
-        # Start reading loop
-        await self.handle_incoming_messages()
+    def send_message(self, message: BGPMessage):
+        self.send_wire([message.pack()])
 
-    async def send_message(self, message: BGPMessage):
-        data = message.pack()
-        if self.writer:
-            self.writer.write(data)
-            await self.writer.drain()
-            self.msgs_sent += 1
+    def send_wire(self, wire: list[bytes]):
+        """Queues packed messages back to back on the transport; every send goes through here."""
+        if self.transport:
+            self.transport.writelines(wire)
+            self.msgs_sent += len(wire)
 
-    async def send_open(self):
+    def send_open(self):
         self.logger.info("Sending OPEN message")
-        msg = OpenMessage(
-            version=4,
-            my_as=self.my_as,
-            hold_time=self.hold_time,
-            bgp_identifier=self.bgp_id,
-        )
-        await self.send_message(msg)
+        self.send_wire([self._open_wire])
 
-    async def send_update(self):
+    def send_update(self):
         """Sends an UPDATE message with originated prefixes."""
         if not self.originated_prefixes:
             return
 
         self.logger.info(f"Sending UPDATE with prefixes: {self.originated_prefixes}")
 
-        # Construct Attributes
-        path_attributes = b""
-
-        # ORIGIN: IGP
-        path_attributes += UpdateMessage.encode_origin(0)
-
-        # AS_PATH: Empty (local origination)
-        path_attributes += UpdateMessage.encode_as_path([self.my_as])
-
-        # NEXT_HOP: Self
-        path_attributes += UpdateMessage.encode_next_hop(self.bgp_id)
-
-        # NLRI
-        nlri = UpdateMessage.encode_nlri(self.originated_prefixes)
-
-        msg = UpdateMessage(withdrawn_routes=b"", path_attributes=path_attributes, nlri=nlri)
-        await self.send_message(msg)
-
-    async def send_keepalive(self):
-        # self.logger.debug("Sending KEEPALIVE")
-        msg = KeepAliveMessage()
-        await self.send_message(msg)
+        self.send_wire(self._update_wire)
+
+    def pack_updates(self) -> list[bytes]:
+        """Packs the UPDATE messages carrying the originated prefixes."""
+        # Construct Attributes, joined in one allocation
+        path_attributes = b"".join(
+            [
+                # ORIGIN: IGP
+                UpdateMessage.encode_origin(0),
+                # AS_PATH: Empty (local origination)
+                UpdateMessage.encode_as_path([self.my_as]),
+                # NEXT_HOP: Self
+                UpdateMessage.encode_next_hop(self.bgp_id),
+            ]
+        )
 
-    async def send_notification(self, error_code, error_subcode, data=b""):
+        # NLRI, split so each UPDATE fits in a BGP message even if every prefix needs the full 5 bytes
+        per_update = (MAX_MESSAGE_LEN - UPDATE_FIXED_LEN - len(path_attributes)) // MAX_PREFIX_NLRI_LEN
+        return [
+            UpdateMessage(
+                withdrawn_routes=b"",
+                path_attributes=path_attributes,
+                nlri=UpdateMessage.encode_nlri(self.originated_prefixes[i : i + per_update]),
+            ).pack()
+            for i in range(0, len(self.originated_prefixes), per_update)
+        ]
+
+    def send_keepalive(self):
+        self.send_wire([_KEEPALIVE_WIRE])
+
+    def send_notification(self, error_code, error_subcode, data=b""):
         self.logger.error(f"Sending NOTIFICATION: {error_code}, {error_subcode}")
         msg = NotificationMessage(error_code, error_subcode, data)
-        await self.send_message(msg)
+        self.send_message(msg)
         self.close_connection()
 
     def close_connection(self):
         self.logger.info("Closing connection")
-        if self.writer:
-            self.writer.close()
+        if self.transport:
+            self.transport.close()
+            self.transport = None
             # Stop timers
-            if self.keepalive_timer_task:
-                self.keepalive_timer_task.cancel()
-            if self.hold_timer_task:
-                self.hold_timer_task.cancel()
+            if self.keepalive_timer:
+                self.keepalive_timer.cancel()
+            if self.hold_timer:
+                self.hold_timer.cancel()
             self.state = BGPState.IDLE
 
-    async def handle_incoming_messages(self):
+    def data_received(self, data: bytes):
+        # Parse every complete message in the buffer; a partial one waits for the next chunk
+        buf = self._buf
+        buf += data
+        pos = 0
         try:
-            while True:
-                # Read Header
+            with memoryview(buf) as view:
                 # 16 marker + 2 len + 1 type
-                header_bytes = await self.reader.readexactly(19)
-                try:
-                    header, _ = BGPHeader.unpack(header_bytes)
-                except Exception as e:
-                    self.logger.error(f"Header Error: {e}")
-                    # Header Error (1), Synchronization Error (invalid marker?)
-                    # Need to implement specific error handling
-                    await self.send_notification(1, 1)
-                    return
-
-                payload_len = header.length - 19
-                if payload_len > 0:
-                    payload = await self.reader.readexactly(payload_len)
-                else:
-                    payload = b""
-
-                try:
-                    msg = parse_bgp_message(header, payload)
-                except Exception as e:
-                    self.logger.error(f"Message Parse Error: {e}")
-                    # Malformed Message?
-                    return
-
-                await self.process_message(msg)
-
-        except asyncio.IncompleteReadError:
-            self.logger.info("Peer closed connection")
-            self.close_connection()
-        except ConnectionResetError:
-            self.logger.info("Connection reset by peer")
-            self.close_connection()
+                while len(buf) - pos >= 19:
+                    length = BGPHeader.peek_length(buf, pos)
+                    if not 19 <= length <= MAX_MESSAGE_LEN:
+                        self.logger.error(f"Header Error: bad message length {length}")
+                        # Header Error (1), Bad Message Length (2)
+                        self.send_notification(1, 2)
+                        return
+                    if len(buf) - pos < length:
+                        break
+
+                    try:
+                        header, payload = BGPHeader.unpack(view[pos : pos + length])
+                        # Copy out so no view of buf outlives this iteration
+                        payload = bytes(payload)
+                    except Exception as e:
+                        self.logger.error(f"Header Error: {e}")
+                        # Header Error (1), Synchronization Error (invalid marker?)
+                        # Need to implement specific error handling
+                        self.send_notification(1, 1)
+                        return
+                    pos += length
+
+                    try:
+                        msg = parse_bgp_message(header, payload)
+                    except Exception as e:
+                        self.logger.error(f"Message Parse Error: {e}")
+                        if header.type == NOTIFICATION:
+                            # Never answer a NOTIFICATION with one
+                            self.close_connection()
+                        else:
+                            self.send_notification(*_PARSE_ERRORS.get(header.type, (1, 3)))
+                        return
+
+                    self.process_message(msg)
+                    if self.transport is None:
+                        # The message closed the session
+                        return
+
         except Exception as e:
             self.logger.error(f"Unexpected error in read loop: {e}")
             self.close_connection()
+        finally:
+            # Runs once the view is released; a closed session has no use for the rest
+            if self.transport is None:
+                buf.clear()
+            else:
+                del buf[:pos]
 
-    async def process_message(self, msg: BGPMessage):
+    def process_message(self, msg: BGPMessage):
         self.msgs_received += 1
-        self.logger.info(f"Received message: {msg.msg_type} in State: {self.state}")
+        if self._info_enabled:
+            self._log_info("Received message: %s in State: %s", msg.msg_type, self.state)
 
         # Reset Hold Timer
-        self.hold_timer_reset_event.set()
+        self.hold_deadline = self.loop.time() + self.negotiated_hold_time
 
-        if self.state == BGPState.OPEN_SENT:
-            if isinstance(msg, OpenMessage):
-                if msg.hold_time < self.hold_time:
-                    self.negotiated_hold_time = msg.hold_time
-                else:
-                    self.negotiated_hold_time = self.hold_time
+        # Combinations without a handler (e.g. KEEPALIVE in ESTABLISHED) need no action
+        handler = self._HANDLERS.get((self.state, type(msg)))
+        if handler:
+            handler(self, msg)
 
-                self.remote_as = msg.my_as
-                self.logger.info(f"Negotiated Hold Time: {self.negotiated_hold_time}, Remote AS: {self.remote_as}")
+    def _on_open_in_open_sent(self, msg: OpenMessage):
+        if msg.hold_time < self.hold_time:
+            self.negotiated_hold_time = msg.hold_time
+        else:
+            self.negotiated_hold_time = self.hold_time
 
-                await self.send_keepalive()
-                self.state = BGPState.OPEN_CONFIRM
+        self.remote_as = msg.my_as
+        self.logger.info(f"Negotiated Hold Time: {self.negotiated_hold_time}, Remote AS: {self.remote_as}")
 
-                if self.negotiated_hold_time > 0:
-                    self.keepalive_timer_task = asyncio.create_task(self.keepalive_loop())
-                    self.hold_timer_task = asyncio.create_task(self.hold_timer_loop())
+        self.send_keepalive()
+        self.state = BGPState.OPEN_CONFIRM
 
-            elif isinstance(msg, NotificationMessage):
-                self.logger.error(f"Received Notification in OPEN_SENT: {msg}")
-                self.close_connection()
-            else:
-                self.logger.error(f"Received unexpected message in OPEN_SENT: {msg}")
-                await self.send_notification(5, 1)
-
-        elif self.state == BGPState.OPEN_CONFIRM:
-            if isinstance(msg, KeepAliveMessage):
-                self.state = BGPState.ESTABLISHED
-                self.logger.info("BGP Session ESTABLISHED")
-                await self.send_update()
-            elif isinstance(msg, NotificationMessage):
-                self.close_connection()
-            elif isinstance(msg, OpenMessage):
-                await self.send_notification(5, 1)
-
-        elif self.state == BGPState.ESTABLISHED:
-            if isinstance(msg, UpdateMessage):
-                self.logger.info(f"Received UPDATE: {len(msg.nlri)} bytes NLRI")
-                self.handle_update_msg(msg)
-            elif isinstance(msg, KeepAliveMessage):
-                pass
-            elif isinstance(msg, NotificationMessage):
-                self.logger.info(f"Received Notification: {msg}")
-                self.close_connection()
-            else:
-                self.logger.error(f"Unexpected message in ESTABLISHED: {msg}")
+        if self.negotiated_hold_time > 0:
+            self.keepalive_interval = self.negotiated_hold_time / 3
+            self.keepalive_timer = self.loop.call_later(self.keepalive_interval, self.keepalive_timer_expired)
+            self.hold_deadline = self.loop.time() + self.negotiated_hold_time
+            self.hold_timer = self.loop.call_later(self.negotiated_hold_time, self.hold_timer_expired)
 
-    def handle_update_msg(self, msg: UpdateMessage):
-        # Very basic parsing for demo
-        # Parse NLRI
-        prefixes = []
-        data = msg.nlri
-        idx = 0
-        while idx < len(data):
-            length = data[idx]
-            idx += 1
-            num_bytes = (length + 7) // 8
-            prefix_bytes = data[idx : idx + num_bytes]
-            idx += num_bytes
-
-            # Pad to 4 bytes for valid ipv4 conversion
-            padded = prefix_bytes + b"\x00" * (4 - len(prefix_bytes))
-            import socket
-
-            ip_str = socket.inet_ntoa(padded)
-            prefixes.append(f"{ip_str}/{length}")
-
-        # Parse basic attributes to find NEXT_HOP
-        next_hop = "Unknown"
-        as_path = []
-
-        # This parsing is extremely simplified and brittle, purely for the demo requirement
-        # A real parser would iterate over path attributes properly via TLV.
-        # We can try to scan for NEXT_HOP (Type 3)
-        pa = msg.path_attributes
-        pidx = 0
-        while pidx < len(pa):
-            flags = pa[pidx]
-            type_code = pa[pidx + 1]
-            pidx += 2
-
-            # Check extended length flag (0x10)
-            if flags & 0x10:
-                attr_len = struct.unpack("!H", pa[pidx : pidx + 2])[0]
-                pidx += 2
-            else:
-                attr_len = pa[pidx]
-                pidx += 1
+    def _on_notification_in_open_sent(self, msg: NotificationMessage):
+        self.logger.error(f"Received Notification in OPEN_SENT: {msg}")
+        self.close_connection()
+
+    def _on_unexpected_in_open_sent(self, msg: BGPMessage):
+        self.logger.error(f"Received unexpected message in OPEN_SENT: {msg}")
+        self.send_notification(5, 1)
+
+    def _on_keepalive_in_open_confirm(self, msg: KeepAliveMessage):
+        self.state = BGPState.ESTABLISHED
+        self.logger.info("BGP Session ESTABLISHED")
+        self.send_update()
+
+    def _on_notification_in_open_confirm(self, msg: NotificationMessage):
+        self.close_connection()
 
-            attr_val = pa[pidx : pidx + attr_len]
+    def _on_open_in_open_confirm(self, msg: OpenMessage):
+        self.send_notification(5, 1)
 
-            if type_code == 3:  # NEXT_HOP
-                import socket
+    def _on_update_in_established(self, msg: UpdateMessage):
+        if self._info_enabled:
+            self._log_info("Received UPDATE: %d bytes NLRI", len(msg.nlri))
+        self.handle_update_msg(msg)
 
-                next_hop = socket.inet_ntoa(attr_val)
-            elif type_code == 2:  # AS_PATH
-                # Parse AS Sequence if possible
-                pass
+    def _on_notification_in_established(self, msg: NotificationMessage):
+        self.logger.info(f"Received Notification: {msg}")
+        self.close_connection()
 
-            pidx += attr_len
+    def _on_unexpected_in_established(self, msg: BGPMessage):
+        self.logger.error(f"Unexpected message in ESTABLISHED: {msg}")
+
+    # (state, message class) -> handler, so dispatch is a single dict lookup per message
+    _HANDLERS = {
+        (BGPState.OPEN_SENT, OpenMessage): _on_open_in_open_sent,
+        (BGPState.OPEN_SENT, NotificationMessage): _on_notification_in_open_sent,
+        (BGPState.OPEN_SENT, KeepAliveMessage): _on_unexpected_in_open_sent,
+        (BGPState.OPEN_SENT, UpdateMessage): _on_unexpected_in_open_sent,
+        (BGPState.OPEN_CONFIRM, KeepAliveMessage): _on_keepalive_in_open_confirm,
+        (BGPState.OPEN_CONFIRM, NotificationMessage): _on_notification_in_open_confirm,
+        (BGPState.OPEN_CONFIRM, OpenMessage): _on_open_in_open_confirm,
+        (BGPState.ESTABLISHED, UpdateMessage): _on_update_in_established,
+        (BGPState.ESTABLISHED, NotificationMessage): _on_notification_in_established,
+        (BGPState.ESTABLISHED, OpenMessage): _on_unexpected_in_established,
+    }
 
-        for p in prefixes:
-            self.adj_rib_in.append(Route(prefix=p, next_hop=next_hop, as_path=[], origin="IGP"))
+    def handle_update_msg(self, msg: UpdateMessage):
+        # Very basic parsing for demo: only NEXT_HOP is read from the path attributes
+        next_hop = UpdateMessage.decode_next_hop(msg.path_attributes) or "Unknown"
+
+        # Routes from one UPDATE share its attributes, including a single immutable AS_PATH
+        as_path = ()
+        rib_size = len(self.adj_rib_in)
+        self.adj_rib_in.extend(
+            Route(prefix=prefix, next_hop=next_hop, as_path=as_path, origin="IGP")
+            for prefix in UpdateMessage.decode_nlri(msg.nlri)
+        )
+        self.rib_version += 1
 
-        self.logger.info(f"Updated RIB with routes: {prefixes}")
+        if self._info_enabled:
+            self._log_info("Updated RIB with %d routes via %s", len(self.adj_rib_in) - rib_size, next_hop)
 
-    async def keepalive_loop(self):
+    def keepalive_timer_expired(self):
         """Sends Keepalives at 1/3 of the hold time."""
-        interval = self.negotiated_hold_time / 3
-        try:
-            while True:
-                await asyncio.sleep(interval)
-                if self.state in [BGPState.OPEN_CONFIRM, BGPState.ESTABLISHED]:
-                    await self.send_keepalive()
-        except asyncio.CancelledError:
-            pass
-
-    async def hold_timer_loop(self):
+        # Armed on entering OPEN_CONFIRM and cancelled by close_connection, so the
+        # session is always in OPEN_CONFIRM or ESTABLISHED when this fires
+        self.send_keepalive()
+        self.keepalive_timer = self.loop.call_later(self.keepalive_interval, self.keepalive_timer_expired)
+
+    def hold_timer_expired(self):
         """Checks if no message received within hold time."""
-        try:
-            while True:
-                self.hold_timer_reset_event.clear()
-                try:
-                    await asyncio.wait_for(
-                        self.hold_timer_reset_event.wait(),
-                        timeout=self.negotiated_hold_time,
-                    )
-                except asyncio.TimeoutError:
-                    self.logger.error("Hold Timer Expired")
-                    await self.send_notification(4, 0)  # Hold Timer Expired
-                    return
-        except asyncio.CancelledError:
-            pass
+        remaining = self.hold_deadline - self.loop.time()
+        if remaining > 0:
+            # Messages arrived since the timer was armed
+            self.hold_timer = self.loop.call_later(remaining, self.hold_timer_expired)
+            return
+
+        self.hold_timer = None
+        self.logger.error("Hold Timer Expired")
+        # close() still flushes the queued NOTIFICATION
+        self.send_message(NotificationMessage(4, 0))  # Hold Timer Expired
+        self.close_connection()
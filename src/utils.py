@@ -1,18 +1,48 @@
 import logging
+import struct
 import sys
+from typing import Optional
+
+# 4-byte big-endian length prefix framing every management request and response
+FRAME_LEN = struct.Struct("!I")
+
+# Every logger shares one formatter, and each name is configured only once
+_FORMATTER = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+_LOGGERS: dict[str, logging.Logger] = {}
+# Set by log_to_file; loggers write to stdout otherwise
+_FILE_HANDLER: Optional[logging.FileHandler] = None
+
+
+def log_to_file(path: str):
+    """Sends every logger from setup_logging, existing and future ones, to path instead of stdout."""
+    global _FILE_HANDLER
+    _FILE_HANDLER = logging.FileHandler(path)
+    _FILE_HANDLER.setLevel(logging.DEBUG)
+    _FILE_HANDLER.setFormatter(_FORMATTER)
+    for logger in _LOGGERS.values():
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.addHandler(_FILE_HANDLER)
 
 
 def setup_logging(name: str = "BGP") -> logging.Logger:
     """Configures and returns a logger with standard formatting."""
+    logger = _LOGGERS.get(name)
+    if logger is not None:
+        return logger
+
     logger = logging.getLogger(name)
     logger.setLevel(logging.DEBUG)
 
     # Check if handler already exists to avoid duplication
     if not logger.handlers:
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setLevel(logging.DEBUG)
-        formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
+        if _FILE_HANDLER is not None:
+            logger.addHandler(_FILE_HANDLER)
+        else:
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setLevel(logging.DEBUG)
+            handler.setFormatter(_FORMATTER)
+            logger.addHandler(handler)
 
+    _LOGGERS[name] = logger
     return logger
@@ -0,0 +1,11 @@
+from src.protocol import UpdateMessage
+
+
+def make_update(prefixes, next_hop="2.2.2.2", as_path=(65002,)):
+    """Builds an UPDATE announcing prefixes with ORIGIN, AS_PATH and NEXT_HOP attributes."""
+    path_attributes = (
+        UpdateMessage.encode_origin(0)
+        + UpdateMessage.encode_as_path(list(as_path))
+        + UpdateMessage.encode_next_hop(next_hop)
+    )
+    return UpdateMessage(path_attributes=path_attributes, nlri=UpdateMessage.encode_nlri(prefixes))
@@ -0,0 +1,122 @@
+import asyncio
+import struct
+
+import orjson
+
+from src.config import BGPConfig, LocalConfig
+from src.mgmt import MAX_REQUEST_LEN, ROUTE_COLUMNS
+from src.server import BGPServer
+from src.session import BGPSession
+
+from helpers import make_update
+
+
+def make_server(peers):
+    """Builds a BGPServer with one session per {peer_ip: prefixes} entry, without any sockets."""
+    server = BGPServer(BGPConfig(local=LocalConfig(asn=65001, router_id="1.1.1.1")))
+    for peer_ip, prefixes in peers.items():
+        session = BGPSession(65001, "1.1.1.1", peer_ip)
+        session.remote_as = 65002
+        if prefixes:
+            session.handle_update_msg(make_update(prefixes))
+        server.sessions[peer_ip] = session
+    return server
+
+
+def test_show_routes_received_filtered_by_peer():
+    server = make_server({"10.0.0.2": ["20.0.1.0/24"], "10.0.0.3": ["20.0.2.0/24"]})
+    mgmt = server.mgmt_server
+
+    neighbors = mgmt.handle_request({"command": "show_neighbors"})["data"]
+    assert [n["peer_ip"] for n in neighbors] == ["10.0.0.2", "10.0.0.3"]
+
+    # The peer_ip reported by show_neighbors is the key the filter accepts
+    response = mgmt.handle_request({"command": "show_routes_received", "peer_ip": "10.0.0.3"})
+    assert response["data"]["rows"] == [("20.0.2.0/24", "2.2.2.2", "[]", "IGP", 65002, "10.0.0.3")]
+
+
+def test_encode_response_full_table():
+    # The empty sessions must not leave stray separators in the spliced rows
+    server = make_server(
+        {
+            "10.0.0.1": [],
+            "10.0.0.2": ["20.0.1.0/24", "20.0.2.0/24"],
+            "10.0.0.3": [],
+            "10.0.0.4": ["20.0.3.0/24"],
+        }
+    )
+    mgmt = server.mgmt_server
+
+    response = orjson.loads(b"".join(mgmt.encode_response({"command": "show_routes_received"})))
+
+    assert response["status"] == "success"
+    assert response["data"]["columns"] == ROUTE_COLUMNS
+    assert [(row[0], row[-1]) for row in response["data"]["rows"]] == [
+        ("20.0.1.0/24", "10.0.0.2"),
+        ("20.0.2.0/24", "10.0.0.2"),
+        ("20.0.3.0/24", "10.0.0.4"),
+    ]
+    # Same rows as the non-spliced path
+    assert response == orjson.loads(orjson.dumps(mgmt.handle_request({"command": "show_routes_received"})))
+
+
+def test_encode_response_no_routes():
+    server = make_server({"10.0.0.1": []})
+    parts = server.mgmt_server.encode_response({"command": "show_routes_received"})
+    assert orjson.loads(b"".join(parts))["data"]["rows"] == []
+
+
+def test_encode_response_rebuilds_rows_after_rib_change():
+    server = make_server({"10.0.0.2": ["20.0.1.0/24"]})
+    mgmt = server.mgmt_server
+    session = server.sessions["10.0.0.2"]
+
+    def rows():
+        return orjson.loads(b"".join(mgmt.encode_response({"command": "show_routes_received"})))["data"]["rows"]
+
+    assert [row[0] for row in rows()] == ["20.0.1.0/24"]
+
+    session.handle_update_msg(make_update(["20.0.2.0/24"]))
+    assert [row[0] for row in rows()] == ["20.0.1.0/24", "20.0.2.0/24"]
+
+    session.remote_as = 65003
+    assert {row[4] for row in rows()} == {65003}
+
+
+def test_count_peers_by_asn():
+    server = make_server({"10.0.0.2": [], "10.0.0.3": []})
+    server.sessions["10.0.0.3"].remote_as = 65003
+    mgmt = server.mgmt_server
+
+    assert mgmt.handle_request({"command": "count_peers_by_asn", "asn": 65002})["data"] == 1
+    assert mgmt.handle_request({"command": "count_peers_by_asn", "asn": 65004})["data"] == 0
+
+
+def test_handle_client_framing(tmp_path):
+    server = make_server({"10.0.0.2": ["20.0.1.0/24"]})
+    socket_path = str(tmp_path / "mgmt.sock")
+
+    async def main():
+        unix_server = await asyncio.start_unix_server(server.mgmt_server.handle_client, path=socket_path)
+        async with unix_server:
+            # Several commands over one connection, then an oversized frame that closes it
+            reader, writer = await asyncio.open_unix_connection(socket_path)
+            try:
+                responses = []
+                for command in ("show_neighbors", "show_routes_received"):
+                    request = orjson.dumps({"command": command})
+                    writer.write(struct.pack("!I", len(request)) + request)
+                    length = struct.unpack("!I", await reader.readexactly(4))[0]
+                    responses.append(orjson.loads(await reader.readexactly(length)))
+
+                writer.write(struct.pack("!I", MAX_REQUEST_LEN + 1))
+                closed = await reader.read() == b""
+            finally:
+                writer.close()
+            return responses, closed
+
+    (neighbors, routes), closed = asyncio.run(asyncio.wait_for(main(), 5))
+
+    assert [n["peer_ip"] for n in neighbors["data"]] == ["10.0.0.2"]
+    assert [row[0] for row in routes["data"]["rows"]] == ["20.0.1.0/24"]
+    assert closed
@@ -1,4 +1,7 @@
 import struct
+
+import pytest
+
 from src.protocol import (
     BGPHeader,
     OpenMessage,
@@ -26,6 +29,12 @@ def test_bgp_header_unpack():
     assert payload == b""
 
 
+def test_bgp_header_unpack_invalid_marker():
+    data = b"\xff" * 15 + b"\x00" + struct.pack("!HB", 19, KEEPALIVE)
+    with pytest.raises(ValueError, match="Invalid BGP marker"):
+        BGPHeader.unpack(data)
+
+
 def test_open_message():
     msg = OpenMessage(4, 65001, 180, "192.168.1.1")
     packed = msg.pack()
@@ -64,3 +73,33 @@ def test_update_message_empty():
     assert unpacked.withdrawn_routes == b""
     assert unpacked.path_attributes == b""
     assert unpacked.nlri == b""
+
+
+def test_encode_nlri():
+    nlri = UpdateMessage.encode_nlri(["10.0.0.0/24", "172.16.0.0/16", "192.168.1.128/25"])
+    assert nlri == b"\x18\x0a\x00\x00" + b"\x10\xac\x10" + b"\x19\xc0\xa8\x01\x80"
+
+
+def test_encode_as_path():
+    assert UpdateMessage.encode_as_path([]) == b"\x40\x02\x00"
+    assert UpdateMessage.encode_as_path([65001, 65002]) == b"\x40\x02\x06\x02\x02\xfd\xe9\xfd\xea"
+
+
+def test_encode_next_hop():
+    assert UpdateMessage.encode_next_hop("192.168.1.1") == b"\x40\x03\x04\xc0\xa8\x01\x01"
+
+
+def test_decode_nlri():
+    prefixes = ["10.0.0.0/24", "172.16.0.0/16", "192.168.1.128/25", "0.0.0.0/0"]
+    assert UpdateMessage.decode_nlri(UpdateMessage.encode_nlri(prefixes)) == prefixes
+
+
+def test_decode_next_hop():
+    path_attributes = UpdateMessage.encode_origin(0) + UpdateMessage.encode_next_hop("192.168.1.1")
+    assert UpdateMessage.decode_next_hop(path_attributes) == "192.168.1.1"
+    assert UpdateMessage.decode_next_hop(UpdateMessage.encode_origin(0)) is None
+
+
+def test_bgp_header_peek_length():
+    data = b"\x00" * 3 + BGPHeader.pack(KEEPALIVE, b"1234")
+    assert BGPHeader.peek_length(data, 3) == 23
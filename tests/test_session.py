@@ -0,0 +1,96 @@
+import asyncio
+
+from src.fsm import BGPState
+from src.protocol import BGPHeader, NotificationMessage, UpdateMessage, MAX_MESSAGE_LEN, UPDATE
+from src.session import BGPSession
+
+from helpers import make_update
+
+
+def test_handle_update_msg():
+    session = BGPSession(65001, "1.1.1.1", "127.0.0.1")
+    session.handle_update_msg(make_update(["20.0.1.0/24", "172.16.0.0/12", "10.1.2.3/32", "0.0.0.0/0"]))
+
+    assert [r.prefix for r in session.adj_rib_in] == ["20.0.1.0/24", "172.16.0.0/12", "10.1.2.3/32", "0.0.0.0/0"]
+    assert all(r.next_hop == "2.2.2.2" for r in session.adj_rib_in)
+    # Routes share one AS_PATH, so it must be immutable
+    assert all(r.as_path == () and r.as_path_str == "[]" for r in session.adj_rib_in)
+    assert session.rib_version == 1
+
+
+def test_handle_update_msg_extended_length_attribute():
+    # ORIGIN encoded with the extended length flag (0x10) set
+    path_attributes = b"\x50\x01\x00\x01\x00" + UpdateMessage.encode_next_hop("3.3.3.3")
+    msg = UpdateMessage(path_attributes=path_attributes, nlri=UpdateMessage.encode_nlri(["20.0.2.0/24"]))
+
+    session = BGPSession(65001, "1.1.1.1", "127.0.0.1")
+    session.handle_update_msg(msg)
+
+    assert [(r.prefix, r.next_hop) for r in session.adj_rib_in] == [("20.0.2.0/24", "3.3.3.3")]
+
+
+class FakeTransport:
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(data)
+
+    def writelines(self, data):
+        self.chunks.extend(data)
+
+    def close(self):
+        self.closed = True
+
+
+def test_send_update_splits_large_nlri():
+    prefixes = [f"10.{i // 256}.{i % 256}.0/24" for i in range(2000)]
+    session = BGPSession(65001, "1.1.1.1", "127.0.0.1", originated_prefixes=prefixes)
+    session.transport = FakeTransport()
+    session.send_update()
+
+    assert len(session.transport.chunks) > 1
+    assert session.msgs_sent == len(session.transport.chunks)
+
+    received = BGPSession(65002, "2.2.2.2", "127.0.0.1")
+    for chunk in session.transport.chunks:
+        assert len(chunk) <= MAX_MESSAGE_LEN
+        header, payload = BGPHeader.unpack(chunk)
+        received.handle_update_msg(UpdateMessage.unpack(payload))
+    assert [r.prefix for r in received.adj_rib_in] == prefixes
+
+
+def test_data_received_reassembles_split_messages():
+    session = BGPSession(65001, "1.1.1.1", "127.0.0.1")
+    session.transport = FakeTransport()
+    session.state = BGPState.ESTABLISHED
+    session.loop = asyncio.new_event_loop()
+    try:
+        wire = make_update(["20.0.1.0/24"]).pack() + make_update(["20.0.2.0/24"]).pack()
+        session.data_received(wire[:10])
+        session.data_received(wire[10:30])
+        assert session.adj_rib_in == []
+        session.data_received(wire[30:])
+    finally:
+        session.loop.close()
+
+    assert [r.prefix for r in session.adj_rib_in] == ["20.0.1.0/24", "20.0.2.0/24"]
+    assert session.msgs_received == 2
+
+
+def test_data_received_malformed_update_sends_notification():
+    session = BGPSession(65001, "1.1.1.1", "127.0.0.1")
+    transport = session.transport = FakeTransport()
+    session.state = BGPState.ESTABLISHED
+    session.loop = asyncio.new_event_loop()
+    try:
+        # Path attribute length (0xffff) runs past the end of the message
+        session.data_received(BGPHeader.pack(UPDATE, b"\x00\x00\xff\xff"))
+    finally:
+        session.loop.close()
+
+    assert transport.chunks == [NotificationMessage(3, 1).pack()]
+    assert transport.closed
+    assert session.state == BGPState.IDLE
+    assert session.adj_rib_in == []